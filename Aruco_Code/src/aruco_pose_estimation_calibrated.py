@@ -7,9 +7,15 @@ import pyrealsense2 as rs
 import numpy as np
 import cv2
 import cv2.aruco as aruco
+import time
 import sys  # Per sys.exit()
 import os   # Per controllare l'esistenza del file di calibrazione
 
+from aruco_tiled_detection import TiledArucoDetector
+from frame_buffers import FrameBuffers
+from aruco_pose_solver import WarmStartPoseSolver
+from motion_gate import MotionGate
+
 def aruco_pose_estimation_calibrated():
     # --- PARAMETRI DI CONFIGURAZIONE ---
     # Nome del file dove sono stati salvati i parametri di calibrazione
@@ -23,6 +29,22 @@ def aruco_pose_estimation_calibrated():
     # QUESTO VALORE DEVE CORRISPONDERE ALLA DIMENSIONE REALE DEL TUO MARKER STAMPATO!
     MARKER_LENGTH = 0.10  # Metri <-- MODIFICA QUESTO CON IL VALORE REALE DEL TUO MARKER
 
+    # Rilevamento a tasselli su più core (utile con molti marker ad alta risoluzione).
+    # TILE_OVERLAP (pixel) deve superare il lato in pixel del marker più grande visibile.
+    TILED_DETECTION = False
+    TILE_GRID = (2, 2)    # (righe, colonne)
+    TILE_OVERLAP = 160    # Pixel
+
+    # Loop a buffer preallocati: immagine grigia e pose vengono riutilizzate
+    # ad ogni frame, eliminando le allocazioni Python/NumPy a regime.
+    # In questa modalità l'allineamento colore/profondità viene saltato (la profondità non è usata).
+    PREALLOCATED_BUFFERS = False
+
+    # Rilevamento condizionato al movimento: se la scena non cambia vengono riutilizzate
+    # le ultime pose; un rilevamento completo è forzato ogni MAX_DETECTION_INTERVAL secondi.
+    GATED_DETECTION = False
+    MAX_DETECTION_INTERVAL = 1.0  # Secondi
+
     # --- INIZIO SCRIPT ---
 
     # 1. Carica i parametri di calibrazione personalizzati
@@ -48,9 +70,13 @@ def aruco_pose_estimation_calibrated():
     pipeline = rs.pipeline()
     config = rs.config()
 
+    # Risoluzione dello stream, usata anche per i buffer preallocati.
+    # Deve coincidere con quella usata in calibrazione (realsense_calibrate.py: 1280x720).
+    frame_width, frame_height = 1280, 720
+
     # Abilita il flusso di colore e profondità (profondità necessaria per l'allineamento dei frame)
-    config.enable_stream(rs.stream.color, 1280, 720, rs.format.bgr8, 30)
-    config.enable_stream(rs.stream.depth, 1280, 720, rs.format.z16, 30)
+    config.enable_stream(rs.stream.color, frame_width, frame_height, rs.format.bgr8, 30)
+    config.enable_stream(rs.stream.depth, frame_width, frame_height, rs.format.z16, 30)
 
     # Inizia lo streaming
     print("\nAvvio della pipeline RealSense...")
@@ -71,6 +97,20 @@ def aruco_pose_estimation_calibrated():
     # 4. Definizione del dizionario ArUco e parametri del rilevatore
     aruco_dict = aruco.getPredefinedDictionary(ARUCO_DICT)
     parameters = aruco.DetectorParameters()
+    tiled_detector = None
+    if TILED_DETECTION:
+        tiled_detector = TiledArucoDetector(aruco_dict, parameters, grid=TILE_GRID, overlap=TILE_OVERLAP)
+        print(f"Rilevamento a tasselli attivo: griglia {TILE_GRID}, sovrapposizione {TILE_OVERLAP} px.")
+    buffers = None
+    if PREALLOCATED_BUFFERS:
+        buffers = FrameBuffers(frame_width, frame_height)
+    motion_gate = None
+    if GATED_DETECTION:
+        motion_gate = MotionGate(max_interval=MAX_DETECTION_INTERVAL)
+
+    # Stima della posa con solvePnP (IPPE_SQUARE); la posa del frame precedente risolve il flip,
+    # al posto della funzione deprecata aruco.estimatePoseSingleMarkers
+    pose_solver = WarmStartPoseSolver(MARKER_LENGTH, camera_matrix, dist_coeffs)
 
     print(f"\nPronto per la stima della posa ArUco (utilizzando calibrazione personalizzata).")
     print(f"Dizionario ArUco: {ARUCO_DICT}, Lunghezza Marker: {MARKER_LENGTH} metri.")
@@ -80,26 +120,57 @@ def aruco_pose_estimation_calibrated():
         while True:
             # Attendi il prossimo set di frame (colore e profondità)
             frames = pipeline.wait_for_frames()
-            aligned_frames = align.process(frames) # Allinea il frame di profondità a quello di colore
-            color_frame = aligned_frames.get_color_frame()
+            if buffers is not None:
+                color_frame = frames.get_color_frame() # Nessun frameset allineato da allocare
+            else:
+                aligned_frames = align.process(frames) # Allinea il frame di profondità a quello di colore
+                color_frame = aligned_frames.get_color_frame()
 
             if not color_frame:
                 continue
 
             color_image = np.asanyarray(color_frame.get_data())
-            gray = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
 
-            # Rileva i marker ArUco nell'immagine in scala di grigi
-            corners, ids, rejectedImgPoints = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+            if motion_gate is not None and not motion_gate.check(color_image):
+                # Scena invariata: riutilizza i risultati (e il timestamp) dell'ultimo rilevamento completo
+                corners, ids, rvecs, tvecs, pose_timestamp = motion_gate.cached
+                pose_cached = True
+                pose_solver.next_frame()  # Il solver non viene chiamato, ma l'età delle pose avanza
+            else:
+                detection_start = time.perf_counter()
+                pose_cached = False
+                # L'età delle pose avanza ad ogni frame, anche senza marker visibili
+                pose_solver.next_frame()
+                if buffers is not None:
+                    gray = buffers.to_gray(color_image)
+                else:
+                    gray = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
+
+                # Rileva i marker ArUco nell'immagine in scala di grigi
+                if tiled_detector is not None:
+                    corners, ids, rejectedImgPoints = tiled_detector.detect(gray)
+                else:
+                    corners, ids, rejectedImgPoints = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+
+                # Stima la posa (rotazione e traslazione) per ogni marker rilevato
+                rvecs = tvecs = None
+                if ids is not None:
+                    if buffers is not None:
+                        rvecs, tvecs = pose_solver.solve(corners, ids, buffers.rvecs, buffers.tvecs)
+                    else:
+                        rvecs, tvecs = pose_solver.solve(corners, ids)
+
+                pose_timestamp = color_frame.get_timestamp()
+                if motion_gate is not None:
+                    motion_gate.update(corners, ids, rvecs, tvecs, pose_timestamp,
+                                       time.perf_counter() - detection_start)
 
             if ids is not None:
                 # Disegna i contorni dei marker rilevati sull'immagine a colori
                 aruco.drawDetectedMarkers(color_image, corners) 
 
-                # Stima la posa (rotazione e traslazione) per ogni marker rilevato
-                rvecs, tvecs, _ = aruco.estimatePoseSingleMarkers(corners, MARKER_LENGTH, camera_matrix, dist_coeffs)
-
-                for i, _id in enumerate(ids):
+                # I buffer hanno capacità fissa: si elaborano solo i marker per cui è stata stimata la posa
+                for i, _id in enumerate(ids[:len(rvecs)]):
                     rvec = rvecs[i] # Vettore di rotazione del marker corrente
                     tvec = tvecs[i] # Vettore di traslazione (posizione X, Y, Z) del marker corrente
 
@@ -114,7 +185,10 @@ def aruco_pose_estimation_calibrated():
                     distance_cm = z * 100 
 
                     # Converte il vettore di rotazione (Rodrigues) in angoli di Eulero (Roll, Pitch, Yaw)
-                    rotation_matrix, _ = cv2.Rodrigues(rvec)
+                    if buffers is not None:
+                        rotation_matrix = buffers.rodrigues(rvec)
+                    else:
+                        rotation_matrix, _ = cv2.Rodrigues(rvec)
                     # Il calcolo degli angoli di Eulero è un po' complesso e può avere problemi di "gimbal lock"
                     # ma è un metodo comune per visualizzare l'orientamento.
                     sy = np.sqrt(rotation_matrix[0,0] * rotation_matrix[0,0] +  rotation_matrix[1,0] * rotation_matrix[1,0])
@@ -142,6 +216,7 @@ def aruco_pose_estimation_calibrated():
 
                     # Stampa le informazioni della terna nel terminale
                     print(f"--- Marker ID: {_id[0]} ---")
+                    print(f"  Timestamp del frame: {pose_timestamp:.0f} ms" + (" (dalla cache)" if pose_cached else ""))
                     print(f"  Posizione (X, Y, Z): ({x:.4f} m, {y:.4f} m, {z:.4f} m)")
                     print(f"  Distanza dalla Camera (Z): {distance_cm:.2f} cm")
                     print(f"  Orientamento (Roll, Pitch, Yaw): ({np.degrees(roll):.2f}°, {np.degrees(pitch):.2f}°, {np.degrees(yaw):.2f}°)")
@@ -158,6 +233,13 @@ def aruco_pose_estimation_calibrated():
         # Assicurati di fermare il pipeline della telecamera e chiudere tutte le finestre OpenCV
         pipeline.stop()
         cv2.destroyAllWindows()
+        if tiled_detector is not None:
+            tiled_detector.close()
+        if motion_gate is not None:
+            gate_stats = motion_gate.stats()
+            print(f"Gate di movimento: {gate_stats['hits']} frame dalla cache, {gate_stats['misses']} per variazione, "
+                  f"{gate_stats['forced']} forzati (hit rate {gate_stats['hit_rate']:.1%}, "
+                  f"costo gate {gate_stats['gate_ms']:.2f} ms/frame, CPU risparmiata ~{gate_stats['saved_s']:.1f} s)")
 
 if __name__ == "__main__":
     aruco_pose_estimation_calibrated()
\ No newline at end of file
@@ -7,40 +7,79 @@ import pyrealsense2 as rs
 import numpy as np
 import cv2
 import cv2.aruco as aruco
+import time
 import sys # Per sys.exit()
 
+from aruco_tiled_detection import TiledArucoDetector
+from frame_buffers import FrameBuffers
+from aruco_pose_solver import WarmStartPoseSolver
+from motion_gate import MotionGate
+
 def aruco_pose_estimation_realsense_factory_intrinsics():
+    # Modalità infrarossi: il rilevatore lavora in scala di grigi, quindi invece del colore BGR
+    # si usa lo stream infrarosso sinistro in formato Y8 (1 byte per pixel, frame rate più alti).
+    # Il frame viene letto direttamente come vista NumPy, senza copie né cvtColor, e l'emettitore
+    # IR viene spento perché il pattern di punti proiettato disturba il rilevamento dei marker
+    # (il suo stato precedente viene ripristinato all'uscita).
+    INFRARED_MODE = False
+    INFRARED_WIDTH = 848   # D415/D435: 848x480 fino a 90 fps, 1280x720 fino a 30 fps
+    INFRARED_HEIGHT = 480
+    INFRARED_FPS = 90
+
+    # Se False non viene aperta alcuna finestra e non viene prodotta l'immagine a 3 canali
+    # per l'overlay (solo stampa nel terminale, Ctrl+C per uscire).
+    SHOW_OVERLAY = True
+
     # 1. Configurazione della telecamera RealSense
     pipeline = rs.pipeline()
     config = rs.config()
 
-    # Abilita il flusso di colore e profondità
-    config.enable_stream(rs.stream.color, 1280, 720, rs.format.bgr8, 30)
-    config.enable_stream(rs.stream.depth, 1280, 720, rs.format.z16, 30)
+    if INFRARED_MODE:
+        # Solo lo stream infrarosso sinistro (indice 1)
+        config.enable_stream(rs.stream.infrared, 1, INFRARED_WIDTH, INFRARED_HEIGHT, rs.format.y8, INFRARED_FPS)
+        frame_width, frame_height = INFRARED_WIDTH, INFRARED_HEIGHT
+    else:
+        # Abilita il flusso di colore e profondità
+        config.enable_stream(rs.stream.color, 1280, 720, rs.format.bgr8, 30)
+        config.enable_stream(rs.stream.depth, 1280, 720, rs.format.z16, 30)
+        frame_width, frame_height = 1280, 720
 
     # Inizia lo streaming e ottieni il profilo per gli intrinseci
     print("Avvio della pipeline RealSense e recupero parametri intrinseci...")
     profile = None
+    depth_sensor = None
+    emitter_state = None  # Stato dell'emettitore IR da ripristinare all'uscita
     try:
         profile = pipeline.start(config)
+        if INFRARED_MODE:
+            depth_sensor = profile.get_device().first_depth_sensor()
+            if depth_sensor.supports(rs.option.emitter_enabled):
+                emitter_state = depth_sensor.get_option(rs.option.emitter_enabled)
+                depth_sensor.set_option(rs.option.emitter_enabled, 0)
         # Aspetta qualche frame per stabilizzare il pipeline
         for _ in range(30): # ~1 secondo a 30fps
             pipeline.wait_for_frames()
     except Exception as e:
         print(f"ERRORE: Impossibile avviare la telecamera RealSense. Assicurati che sia connessa e non in uso.")
         print(f"Dettagli errore: {e}")
+        if emitter_state is not None:
+            depth_sensor.set_option(rs.option.emitter_enabled, emitter_state)
         sys.exit(1)
 
-    # 2. Recupera i parametri intrinseci della telecamera dal flusso di colore usando l'API pyrealsense2
+    # 2. Recupera i parametri intrinseci della telecamera dal flusso usato (colore o infrarosso) usando l'API pyrealsense2
     # Questi sono i parametri predefiniti di fabbrica della tua RealSense D415.
-    color_intrinsics = profile.get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics()
+    if INFRARED_MODE:
+        stream_profile = profile.get_stream(rs.stream.infrared, 1)
+    else:
+        stream_profile = profile.get_stream(rs.stream.color)
+    intrinsics = stream_profile.as_video_stream_profile().get_intrinsics()
 
-    camera_matrix = np.array([[color_intrinsics.fx, 0, color_intrinsics.ppx],
-                              [0, color_intrinsics.fy, color_intrinsics.ppy],
+    camera_matrix = np.array([[intrinsics.fx, 0, intrinsics.ppx],
+                              [0, intrinsics.fy, intrinsics.ppy],
                               [0, 0, 1]], dtype=np.float32)
 
-    dist_coeffs = np.array([color_intrinsics.coeffs[0], color_intrinsics.coeffs[1], color_intrinsics.coeffs[2],
-                            color_intrinsics.coeffs[3], color_intrinsics.coeffs[4]], dtype=np.float32)
+    dist_coeffs = np.array([intrinsics.coeffs[0], intrinsics.coeffs[1], intrinsics.coeffs[2],
+                            intrinsics.coeffs[3], intrinsics.coeffs[4]], dtype=np.float32)
 
     print("Parametri intrinseci della RealSense recuperati (di fabbrica, NON calibrati):")
     print("Matrice della telecamera:\n", camera_matrix)
@@ -48,9 +87,11 @@ def aruco_pose_estimation_realsense_factory_intrinsics():
     print("\nAVVISO: I valori di posa potrebbero essere imprecisi senza una calibrazione personalizzata.")
 
 
-    # 3. Allineamento dei frame di profondità al frame di colore
-    align_to = rs.stream.color
-    align = rs.align(align_to)
+    # 3. Allineamento dei frame di profondità al frame di colore (non usato in modalità infrarossi)
+    align = None
+    if not INFRARED_MODE:
+        align_to = rs.stream.color
+        align = rs.align(align_to)
 
     # 4. Definizione del dizionario ArUco e parametri
     # Scegli il dizionario ArUco che stai usando (es. DICT_7X7_250)
@@ -62,40 +103,121 @@ def aruco_pose_estimation_realsense_factory_intrinsics():
     # QUESTO VALORE DEVE CORRISPONDERE ALLA DIMENSIONE REALE DEL TUO MARKER STAMPATO!
     MARKER_LENGTH = 0.10  # Metri <-- MODIFICA QUESTO CON IL VALORE REALE DEL TUO MARKER
 
+    # Rilevamento a tasselli su più core (utile con molti marker ad alta risoluzione).
+    # TILE_OVERLAP (pixel) deve superare il lato in pixel del marker più grande visibile.
+    TILED_DETECTION = False
+    TILE_GRID = (2, 2)    # (righe, colonne)
+    TILE_OVERLAP = 160    # Pixel
+
+    # Loop a buffer preallocati: immagine grigia, pose e (in infrarosso) canvas vengono riutilizzati
+    # ad ogni frame, eliminando le allocazioni Python/NumPy a regime.
+    # In questa modalità l'allineamento colore/profondità viene saltato (la profondità non è usata).
+    PREALLOCATED_BUFFERS = False
+
+    # Rilevamento condizionato al movimento: se la scena non cambia vengono riutilizzate
+    # le ultime pose; un rilevamento completo è forzato ogni MAX_DETECTION_INTERVAL secondi.
+    GATED_DETECTION = False
+    MAX_DETECTION_INTERVAL = 1.0  # Secondi
+
+    tiled_detector = None
+    if TILED_DETECTION:
+        tiled_detector = TiledArucoDetector(aruco_dict, parameters, grid=TILE_GRID, overlap=TILE_OVERLAP)
+    buffers = None
+    if PREALLOCATED_BUFFERS:
+        buffers = FrameBuffers(frame_width, frame_height)
+    motion_gate = None
+    if GATED_DETECTION:
+        motion_gate = MotionGate(max_interval=MAX_DETECTION_INTERVAL)
+
+    # Stima della posa con solvePnP (IPPE_SQUARE); la posa del frame precedente risolve il flip,
+    # al posto della funzione deprecata aruco.estimatePoseSingleMarkers
+    pose_solver = WarmStartPoseSolver(MARKER_LENGTH, camera_matrix, dist_coeffs)
+
     print(f"\nPronto per la stima della posa ArUco (con terna, usando intrinseci di fabbrica).")
     print(f"Utilizzando dizionario: {ARUCO_DICT} e marker lungo {MARKER_LENGTH} metri.")
-    print("Premi 'q' per uscire.")
+    print("Premi 'q' per uscire." if SHOW_OVERLAY else "Premi Ctrl+C per uscire.")
 
     try:
         while True:
             frames = pipeline.wait_for_frames()
-            aligned_frames = align.process(frames)
-            color_frame = aligned_frames.get_color_frame()
+            if INFRARED_MODE:
+                video_frame = frames.get_infrared_frame(1)
+            elif buffers is not None:
+                video_frame = frames.get_color_frame()
+            else:
+                aligned_frames = align.process(frames)
+                video_frame = aligned_frames.get_color_frame()
 
-            if not color_frame:
+            if not video_frame:
                 continue
 
-            color_image = np.asanyarray(color_frame.get_data())
-            gray = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
+            # Y8: (H, W) uint8, BGR: (H, W, 3) uint8; in entrambi i casi una vista sul buffer del frame
+            frame_image = np.asanyarray(video_frame.get_data())
 
-            corners, ids, rejectedImgPoints = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+            if motion_gate is not None and not motion_gate.check(frame_image):
+                corners, ids, rvecs, tvecs, pose_timestamp = motion_gate.cached
+                pose_cached = True
+                pose_solver.next_frame()  # Il solver non viene chiamato, ma l'età delle pose avanza
+            else:
+                detection_start = time.perf_counter()
+                pose_cached = False
+                # L'età delle pose avanza ad ogni frame, anche senza marker visibili
+                pose_solver.next_frame()
+                if INFRARED_MODE:
+                    gray = frame_image  # Già in scala di grigi: nessuna conversione
+                elif buffers is not None:
+                    gray = buffers.to_gray(frame_image)
+                else:
+                    gray = cv2.cvtColor(frame_image, cv2.COLOR_BGR2GRAY)
 
-            if ids is not None:
-                aruco.drawDetectedMarkers(color_image, corners) 
+                if tiled_detector is not None:
+                    corners, ids, rejectedImgPoints = tiled_detector.detect(gray)
+                else:
+                    corners, ids, rejectedImgPoints = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+
+                rvecs = tvecs = None
+                if ids is not None:
+                    if buffers is not None:
+                        rvecs, tvecs = pose_solver.solve(corners, ids, buffers.rvecs, buffers.tvecs)
+                    else:
+                        rvecs, tvecs = pose_solver.solve(corners, ids)
+
+                pose_timestamp = video_frame.get_timestamp()
+                if motion_gate is not None:
+                    motion_gate.update(corners, ids, rvecs, tvecs, pose_timestamp,
+                                       time.perf_counter() - detection_start)
 
-                rvecs, tvecs, _ = aruco.estimatePoseSingleMarkers(corners, MARKER_LENGTH, camera_matrix, dist_coeffs)
+            # Immagine a 3 canali per l'overlay, prodotta solo se viene mostrata
+            color_image = None
+            if SHOW_OVERLAY:
+                if INFRARED_MODE:
+                    if buffers is not None:
+                        color_image = buffers.overlay_gray(frame_image)
+                    else:
+                        color_image = cv2.cvtColor(frame_image, cv2.COLOR_GRAY2BGR)
+                else:
+                    # Il frame BGR è già a 3 canali: si disegna direttamente sulla vista
+                    color_image = frame_image
+
+            if ids is not None:
+                if color_image is not None:
+                    aruco.drawDetectedMarkers(color_image, corners) 
 
-                for i, _id in enumerate(ids):
+                for i, _id in enumerate(ids[:len(rvecs)]):
                     rvec = rvecs[i]
                     tvec = tvecs[i]
 
                     # Disegna gli assi sulla terna (più grandi e sottili)
-                    cv2.drawFrameAxes(color_image, camera_matrix, dist_coeffs, rvec, tvec, MARKER_LENGTH * 0.8, thickness=1)
+                    if color_image is not None:
+                        cv2.drawFrameAxes(color_image, camera_matrix, dist_coeffs, rvec, tvec, MARKER_LENGTH * 0.8, thickness=1)
 
                     x, y, z = tvec[0]
                     distance_cm = z * 100 
 
-                    rotation_matrix, _ = cv2.Rodrigues(rvec)
+                    if buffers is not None:
+                        rotation_matrix = buffers.rodrigues(rvec)
+                    else:
+                        rotation_matrix, _ = cv2.Rodrigues(rvec)
                     sy = np.sqrt(rotation_matrix[0,0] * rotation_matrix[0,0] +  rotation_matrix[1,0] * rotation_matrix[1,0])
                     singular = sy < 1e-6
 
@@ -109,28 +231,43 @@ def aruco_pose_estimation_realsense_factory_intrinsics():
                         yaw = 0 
 
                     # Scrive l'ID del marker sull'immagine con una dimensione più piccola
-                    center_x = int(corners[i][0][0][0] + (corners[i][0][2][0] - corners[i][0][0][0]) / 2)
-                    center_y = int(corners[i][0][0][1] + (corners[i][0][2][1] - corners[i][0][0][1]) / 2)
-                    text_x = center_x - 30 
-                    text_y = center_y - 30
+                    if color_image is not None:
+                        center_x = int(corners[i][0][0][0] + (corners[i][0][2][0] - corners[i][0][0][0]) / 2)
+                        center_y = int(corners[i][0][0][1] + (corners[i][0][2][1] - corners[i][0][0][1]) / 2)
+                        text_x = center_x - 30 
+                        text_y = center_y - 30
 
-                    cv2.putText(color_image, f"ID: {_id[0]}", (text_x, text_y), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 1, cv2.LINE_AA) 
+                        cv2.putText(color_image, f"ID: {_id[0]}", (text_x, text_y), 
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 1, cv2.LINE_AA) 
 
                     print(f"ID Marker: {_id[0]}")
+                    print(f"  Timestamp del frame: {pose_timestamp:.0f} ms" + (" (dalla cache)" if pose_cached else ""))
                     print(f"  Posizione (X, Y, Z): ({x:.4f} m, {y:.4f} m, {z:.4f} m)")
                     print(f"  Distanza dalla Camera (Z): {distance_cm:.2f} cm")
                     print(f"  Orientamento (Roll, Pitch, Yaw): ({np.degrees(roll):.2f}°, {np.degrees(pitch):.2f}°, {np.degrees(yaw):.2f}°)")
                     print("-" * 30)
 
-            cv2.imshow('ArUco Pose Estimation (Factory Intrinsics)', color_image)
+            if color_image is not None:
+                cv2.imshow('ArUco Pose Estimation (Factory Intrinsics)', color_image)
 
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
 
+    except KeyboardInterrupt:
+        pass # Uscita con Ctrl+C (necessaria con SHOW_OVERLAY = False)
     finally:
+        if emitter_state is not None:
+            # L'opzione resta salvata sul dispositivo: ripristina lo stato precedente dell'emettitore
+            depth_sensor.set_option(rs.option.emitter_enabled, emitter_state)
         pipeline.stop()
         cv2.destroyAllWindows()
+        if tiled_detector is not None:
+            tiled_detector.close()
+        if motion_gate is not None:
+            gate_stats = motion_gate.stats()
+            print(f"Gate di movimento: {gate_stats['hits']} frame dalla cache, {gate_stats['misses']} per variazione, "
+                  f"{gate_stats['forced']} forzati (hit rate {gate_stats['hit_rate']:.1%}, "
+                  f"costo gate {gate_stats['gate_ms']:.2f} ms/frame, CPU risparmiata ~{gate_stats['saved_s']:.1f} s)")
 
 if __name__ == "__main__":
     aruco_pose_estimation_realsense_factory_intrinsics()
\ No newline at end of file
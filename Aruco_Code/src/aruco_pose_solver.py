@@ -0,0 +1,244 @@
+# Dipendenze necessarie:
+# pip install opencv-contrib-python
+# pip install numpy
+
+import numpy as np
+import cv2
+
+# --- Stima della posa per marker con memoria del frame precedente ---
+# aruco.estimatePoseSingleMarkers è deprecata nelle versioni recenti di OpenCV
+# e risolve ogni marker da zero ad ogni frame. WarmStartPoseSolver usa
+# cv2.solvePnPGeneric con SOLVEPNP_IPPE_SQUARE (soluzione analitica, la più
+# veloce) e conserva la posa precedente di ogni marker.
+#
+# Un marker planare visto quasi frontalmente ha due pose compatibili con gli
+# stessi angoli (ambiguità di "flip"): IPPE_SQUARE restituisce entrambe e,
+# quando i loro errori di riproiezione sono simili, qui si sceglie quella più
+# vicina alla posa precedente, evitando che gli assi disegnati "saltino" da un
+# frame all'altro.
+#
+# Con warm_start=True i marker già tracciati vengono invece risolti con poche
+# iterazioni di Levenberg-Marquardt (cv2.solvePnPRefineLM) a partire dalla posa
+# precedente, più il controllo dell'errore di riproiezione. È più lento di
+# IPPE_SQUARE (vedi `benchmark_aruco.py pose`) e resta disponibile solo come
+# opzione.
+
+# Errore di riproiezione massimo (pixel) accettato per la soluzione iterativa;
+# oltre questa soglia si torna alla soluzione analitica IPPE_SQUARE.
+DEFAULT_MAX_REPROJECTION_ERROR = 2.0
+
+# Numero di frame dopo i quali un marker non più visto smette di essere tracciato.
+DEFAULT_MAX_TRACK_AGE = 5
+
+# Iterazioni massime del raffinamento Levenberg-Marquardt dalla posa precedente.
+DEFAULT_REFINE_ITERATIONS = 5
+
+# Le due soluzioni IPPE_SQUARE sono considerate ambigue se l'errore di
+# riproiezione della seconda non supera questo multiplo di quello della prima.
+AMBIGUITY_RATIO = 3.0
+
+
+def marker_object_points(marker_length):
+    """
+    Restituisce i 4 angoli 3D del marker nel suo sistema di riferimento (centro,
+    asse Z uscente), nell'ordine degli angoli restituiti da aruco.detectMarkers.
+    È lo stesso ordine usato da aruco.estimatePoseSingleMarkers e richiesto
+    da cv2.SOLVEPNP_IPPE_SQUARE.
+
+    Args:
+        marker_length (float): Lato del marker in metri.
+
+    Returns:
+        numpy.ndarray: Array (4, 3) float32.
+    """
+    half = marker_length / 2.0
+    return np.array([[-half,  half, 0],
+                     [ half,  half, 0],
+                     [ half, -half, 0],
+                     [-half, -half, 0]], dtype=np.float32)
+
+
+def rotation_angle_between(rvec_a, rvec_b):
+    """
+    Restituisce l'angolo (radianti) della rotazione relativa tra due rvec.
+    """
+    rotation_a, _ = cv2.Rodrigues(rvec_a)
+    rotation_b, _ = cv2.Rodrigues(rvec_b)
+    cos_angle = (np.trace(rotation_a.T @ rotation_b) - 1.0) / 2.0
+    return float(np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+
+
+class _Track:
+    """Ultima posa nota di un marker (buffer riutilizzati tra un frame e l'altro)."""
+
+    def __init__(self):
+        self.rvec = np.zeros((3, 1), dtype=np.float64)
+        self.tvec = np.zeros((3, 1), dtype=np.float64)
+        self.last_frame = -1
+
+
+class WarmStartPoseSolver:
+    """
+    Sostituto di aruco.estimatePoseSingleMarkers con memoria temporale per marker.
+
+    Il metodo solve() restituisce rvecs/tvecs con forma (N, 1, 3), come la
+    funzione deprecata, quindi il codice di disegno e stampa dei loop live
+    non cambia. Le pose sono associate per ID: un ID presente più volte nello
+    stesso frame viene risolto senza memoria, perché le sue occorrenze non
+    sono distinguibili tra un frame e l'altro.
+
+    Attributi:
+        stats (dict): Contatori 'warm' (raffinamento iterativo accettato),
+                      'cold' (soluzione IPPE_SQUARE) e 'fallback' (raffinamento
+                      scartato per errore di riproiezione eccessivo).
+    """
+
+    def __init__(self, marker_length, camera_matrix, dist_coeffs, warm_start=False,
+                 max_reprojection_error=DEFAULT_MAX_REPROJECTION_ERROR,
+                 max_track_age=DEFAULT_MAX_TRACK_AGE, refine_iterations=DEFAULT_REFINE_ITERATIONS):
+        """
+        Args:
+            marker_length (float): Lato del marker in metri.
+            camera_matrix (numpy.ndarray): Matrice intrinseca 3x3.
+            dist_coeffs (numpy.ndarray): Coefficienti di distorsione.
+            warm_start (bool): Se True, i marker tracciati vengono raffinati dalla posa
+                               precedente; se False (predefinito) usano IPPE_SQUARE e la
+                               posa precedente serve solo a risolvere il flip.
+            max_reprojection_error (float): Soglia (pixel) per accettare il raffinamento.
+            max_track_age (int): Frame dopo i quali un marker non visto viene dimenticato.
+            refine_iterations (int): Iterazioni massime del raffinamento dalla posa precedente.
+        """
+        self.object_points = marker_object_points(marker_length)
+        self.camera_matrix = camera_matrix
+        self.dist_coeffs = dist_coeffs
+        self.warm_start = warm_start
+        self.max_reprojection_error = max_reprojection_error
+        self.max_track_age = max_track_age
+        self.refine_criteria = (cv2.TERM_CRITERIA_COUNT + cv2.TERM_CRITERIA_EPS, refine_iterations, 1e-8)
+        self.stats = {'warm': 0, 'cold': 0, 'fallback': 0}
+        self._tracks = {}
+        self._frame = 0
+        # True se next_frame() ha già aperto il frame corrente
+        self._frame_started = False
+
+    def reset(self):
+        """Dimentica tutte le pose precedenti."""
+        self._tracks.clear()
+
+    def next_frame(self):
+        """
+        Avanza di un frame l'età delle pose tracciate.
+
+        Va chiamato una volta per ogni frame della telecamera, anche quando
+        solve() non viene chiamato (nessun marker visibile, risultati riutilizzati
+        dalla cache): altrimenti un marker che riappare dopo molti frame
+        partirebbe da una posa ormai vecchia. Se non viene chiamato, solve()
+        avanza da solo di un frame ad ogni chiamata.
+        """
+        self._frame += 1
+        self._frame_started = True
+        self._expire()
+
+    def _expire(self):
+        """Rimuove i marker non visti da più di `max_track_age` frame."""
+        expired = [k for k, t in self._tracks.items() if self._frame - t.last_frame > self.max_track_age]
+        for k in expired:
+            del self._tracks[k]
+
+    def _reprojection_error(self, image_points, rvec, tvec):
+        projected, _ = cv2.projectPoints(self.object_points, rvec, tvec, self.camera_matrix, self.dist_coeffs)
+        return float(np.max(np.abs(projected.reshape(4, 2) - image_points.reshape(4, 2))))
+
+    def _solve_warm(self, image_points, track, rvec_out, tvec_out):
+        """Raffinamento iterativo a partire dalla posa precedente. Restituisce True se accettato."""
+        np.copyto(rvec_out, track.rvec)
+        np.copyto(tvec_out, track.tvec)
+        cv2.solvePnPRefineLM(self.object_points, image_points, self.camera_matrix, self.dist_coeffs,
+                             rvec_out, tvec_out, self.refine_criteria)
+        return self._reprojection_error(image_points, rvec_out, tvec_out) <= self.max_reprojection_error
+
+    def _solve_cold(self, image_points, track, rvec_out, tvec_out):
+        """Soluzione analitica IPPE_SQUARE; con una posa precedente risolve l'ambiguità di flip."""
+        _, rvecs, tvecs, errors = cv2.solvePnPGeneric(self.object_points, image_points, self.camera_matrix,
+                                                      self.dist_coeffs, flags=cv2.SOLVEPNP_IPPE_SQUARE)
+        # Le soluzioni sono ordinate per errore di riproiezione crescente
+        best = 0
+        ambiguous = len(rvecs) > 1 and errors[1][0] <= AMBIGUITY_RATIO * errors[0][0]
+        if track is not None and ambiguous:
+            # L'angolo relativo decresce con trace(Ra^T Rb) = somma di Ra * Rb:
+            # basta confrontare i prodotti scalari, senza calcolare l'angolo
+            track_rotation, _ = cv2.Rodrigues(track.rvec)
+            scores = [np.vdot(track_rotation, cv2.Rodrigues(rvec)[0]) for rvec in rvecs]
+            best = int(np.argmax(scores))
+        np.copyto(rvec_out, rvecs[best].reshape(3, 1))
+        np.copyto(tvec_out, tvecs[best].reshape(3, 1))
+
+    def solve(self, corners, ids, rvecs_out=None, tvecs_out=None):
+        """
+        Stima la posa di ogni marker rilevato.
+
+        Args:
+            corners (list): Angoli restituiti da aruco.detectMarkers.
+            ids (numpy.ndarray): ID restituiti da aruco.detectMarkers, forma (N, 1).
+            rvecs_out (numpy.ndarray): Buffer opzionale (capacità, 1, 3) float64 per i risultati.
+            tvecs_out (numpy.ndarray): Buffer opzionale (capacità, 1, 3) float64 per i risultati.
+
+        Returns:
+            tuple: (rvecs, tvecs) con forma (N, 1, 3); se sono forniti i buffer,
+                   sono viste su di essi e N è limitato alla loro capacità.
+        """
+        if not self._frame_started:
+            self._frame += 1
+        self._frame_started = False
+        count = len(corners)
+        if rvecs_out is None:
+            rvecs_out = np.zeros((count, 1, 3), dtype=np.float64)
+            tvecs_out = np.zeros((count, 1, 3), dtype=np.float64)
+        count = min(count, len(rvecs_out))
+
+        # ID ripetuti nel frame (merge_detections li conserva se in posizioni diverse)
+        repeated = ()
+        if count > 1:
+            values, occurrences = np.unique(ids[:count], return_counts=True)
+            if occurrences.max() > 1:
+                repeated = set(values[occurrences > 1].tolist())
+
+        for i in range(count):
+            marker_id = int(ids[i][0])
+            image_points = corners[i]
+            # Viste (3, 1) sui buffer di uscita: OpenCV scrive direttamente al loro interno
+            rvec = rvecs_out[i].reshape(3, 1)
+            tvec = tvecs_out[i].reshape(3, 1)
+
+            if marker_id in repeated:
+                # Nessuna memoria: le occorrenze si contaminerebbero a vicenda
+                self.stats['cold'] += 1
+                self._solve_cold(image_points, None, rvec, tvec)
+                continue
+
+            track = self._tracks.get(marker_id)
+            if track is not None and self._frame - track.last_frame > self.max_track_age:
+                track = None
+
+            if self.warm_start and track is not None:
+                if self._solve_warm(image_points, track, rvec, tvec):
+                    self.stats['warm'] += 1
+                else:
+                    self.stats['fallback'] += 1
+                    self._solve_cold(image_points, track, rvec, tvec)
+            else:
+                self.stats['cold'] += 1
+                self._solve_cold(image_points, track, rvec, tvec)
+
+            if track is None:
+                track = self._tracks.get(marker_id)
+                if track is None:
+                    track = self._tracks[marker_id] = _Track()
+            np.copyto(track.rvec, rvec)
+            np.copyto(track.tvec, tvec)
+            track.last_frame = self._frame
+
+        if len(self._tracks) > count:
+            self._expire()
+
+        return rvecs_out[:count], tvecs_out[:count]
@@ -0,0 +1,271 @@
+# Dipendenze necessarie:
+# pip install pyrealsense2   (solo per RealSenseFrameSource)
+# pip install opencv-contrib-python
+# pip install numpy
+
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+import cv2.aruco as aruco
+
+from aruco_pose_solver import WarmStartPoseSolver
+
+# --- API asyncio per lo stream delle pose ---
+# Gli script live sono loop bloccanti su pipeline.wait_for_frames(). Per
+# integrare il toolkit in un servizio asyncio, PoseEngine espone:
+#
+#     async for poses in engine.stream():
+#         ...
+#
+# La sorgente viene interrogata in modo non bloccante (poll_for_frames) e
+# l'elaborazione (rilevamento + posa) avviene su un thread dedicato, così il
+# loop di eventi non viene mai bloccato. Lo stream è "pull": un nuovo frame
+# viene elaborato solo quando il consumatore chiede il successivo, e nel
+# frattempo la sorgente conserva solo il frame più recente (backpressure:
+# i frame vecchi vengono scartati, la memoria resta limitata).
+# All'uscita dal ciclo, alla cancellazione del task o in caso di errore la
+# sorgente viene fermata (pipeline.stop()).
+
+# Posa di un singolo marker; timestamp è quello del frame di origine (millisecondi).
+MarkerPose = namedtuple('MarkerPose', ['id', 'rvec', 'tvec', 'corners', 'timestamp'])
+
+# Attesa (secondi) tra due interrogazioni della sorgente quando non c'è un nuovo frame.
+DEFAULT_POLL_INTERVAL = 0.002
+
+
+class RealSenseFrameSource:
+    """
+    Sorgente di frame da una telecamera Intel RealSense, interrogata con
+    pipeline.poll_for_frames() (non bloccante).
+
+    Con infrared=True usa lo stream infrarosso sinistro in formato Y8 al posto
+    del colore BGR: il frame è già in scala di grigi e viene restituito come
+    vista NumPy (H, W) sul buffer della telecamera, senza conversioni.
+    """
+
+    def __init__(self, width=1280, height=720, fps=30, infrared=False):
+        # Import locale: il resto del modulo (e la sorgente sintetica) non richiede pyrealsense2
+        import pyrealsense2 as rs
+        self._rs = rs
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.infrared = infrared
+        self._pipeline = None
+        self._profile = None
+        self._depth_sensor = None
+        self._emitter_state = None
+
+    def start(self):
+        """Avvia la pipeline (un solo stream video: la profondità non è usata)."""
+        rs = self._rs
+        self._pipeline = rs.pipeline()
+        config = rs.config()
+        if self.infrared:
+            config.enable_stream(rs.stream.infrared, 1, self.width, self.height, rs.format.y8, self.fps)
+        else:
+            config.enable_stream(rs.stream.color, self.width, self.height, rs.format.bgr8, self.fps)
+        self._profile = self._pipeline.start(config)
+        if self.infrared:
+            # Il pattern di punti dell'emettitore IR disturba il rilevamento dei marker
+            # (lo stato precedente viene ripristinato da stop())
+            depth_sensor = self._profile.get_device().first_depth_sensor()
+            if depth_sensor.supports(rs.option.emitter_enabled):
+                self._depth_sensor = depth_sensor
+                self._emitter_state = depth_sensor.get_option(rs.option.emitter_enabled)
+                depth_sensor.set_option(rs.option.emitter_enabled, 0)
+
+    def intrinsics(self):
+        """Restituisce (camera_matrix, dist_coeffs) di fabbrica dello stream usato."""
+        if self.infrared:
+            stream_profile = self._profile.get_stream(self._rs.stream.infrared, 1)
+        else:
+            stream_profile = self._profile.get_stream(self._rs.stream.color)
+        intr = stream_profile.as_video_stream_profile().get_intrinsics()
+        camera_matrix = np.array([[intr.fx, 0, intr.ppx],
+                                  [0, intr.fy, intr.ppy],
+                                  [0, 0, 1]], dtype=np.float32)
+        dist_coeffs = np.array(intr.coeffs[:5], dtype=np.float32)
+        return camera_matrix, dist_coeffs
+
+    def poll(self):
+        """
+        Returns:
+            tuple: (immagine, timestamp in ms) se è disponibile un nuovo frame, altrimenti None.
+        """
+        frames = self._pipeline.poll_for_frames()
+        if not frames:
+            return None
+        video_frame = frames.get_infrared_frame(1) if self.infrared else frames.get_color_frame()
+        if not video_frame:
+            return None
+        return np.asanyarray(video_frame.get_data()), video_frame.get_timestamp()
+
+    def stop(self):
+        """Ripristina l'emettitore IR e ferma la pipeline (idempotente)."""
+        if self._emitter_state is not None:
+            self._depth_sensor.set_option(self._rs.option.emitter_enabled, self._emitter_state)
+            self._depth_sensor = None
+            self._emitter_state = None
+        if self._pipeline is not None:
+            self._pipeline.stop()
+            self._pipeline = None
+
+
+class SyntheticFrameSource:
+    """
+    Sorgente di frame da una lista di immagini, senza telecamera.
+
+    Con `fps` impostato simula una telecamera reale: i frame "arrivano" al
+    ritmo indicato e poll() restituisce sempre il più recente, scartando quelli
+    non letti in tempo (conteggiati in `dropped`). Con fps=None ogni poll()
+    restituisce il frame successivo. A fine lista poll() solleva EOFError,
+    salvo con loop=True.
+    """
+
+    def __init__(self, images, fps=None, loop=False, camera_matrix=None, dist_coeffs=None):
+        self.images = list(images)
+        self.fps = fps
+        self.loop = loop
+        self.camera_matrix = camera_matrix
+        self.dist_coeffs = dist_coeffs
+        self.started = False
+        self.stopped = False
+        self.dropped = 0
+        self._next = 0
+        self._start_time = None
+
+    def start(self):
+        self.started = True
+        self._start_time = time.monotonic()
+
+    def intrinsics(self):
+        return self.camera_matrix, self.dist_coeffs
+
+    def poll(self):
+        if self.fps is None:
+            index = self._next
+        else:
+            # Indice dell'ultimo frame "arrivato"
+            index = int((time.monotonic() - self._start_time) * self.fps)
+            if index < self._next:
+                return None
+            self.dropped += index - self._next
+        if not self.loop and index >= len(self.images):
+            raise EOFError("Sorgente sintetica esaurita")
+        self._next = index + 1
+        timestamp = index * 1000.0 / (self.fps or 30)
+        return self.images[index % len(self.images)], timestamp
+
+    def stop(self):
+        self.stopped = True
+
+
+class PoseEngine:
+    """
+    Rilevamento ArUco e stima della posa come stream asincrono.
+
+    Esempio:
+        engine = PoseEngine(RealSenseFrameSource(), marker_length=0.10)
+        async for poses in engine.stream():
+            for pose in poses:
+                print(pose.id, pose.tvec)
+    """
+
+    def __init__(self, source, marker_length, aruco_dict_id=aruco.DICT_7X7_250,
+                 camera_matrix=None, dist_coeffs=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        Args:
+            source: Sorgente di frame (RealSenseFrameSource, SyntheticFrameSource o
+                    qualsiasi oggetto con start(), poll(), stop() e intrinsics()).
+            marker_length (float): Lato del marker in metri.
+            aruco_dict_id (int): Dizionario ArUco (es. aruco.DICT_7X7_250).
+            camera_matrix (numpy.ndarray): Matrice intrinseca; se None viene letta dalla sorgente.
+            dist_coeffs (numpy.ndarray): Coefficienti di distorsione; se None letti dalla sorgente.
+            poll_interval (float): Attesa (secondi) tra due interrogazioni senza nuovi frame.
+        """
+        self.source = source
+        self.marker_length = marker_length
+        self.aruco_dict = aruco.getPredefinedDictionary(aruco_dict_id)
+        self.parameters = aruco.DetectorParameters()
+        self.camera_matrix = camera_matrix
+        self.dist_coeffs = dist_coeffs
+        self.poll_interval = poll_interval
+        self.pose_solver = None
+        # Un solo thread: il solver mantiene uno stato tra i frame e li elabora in ordine
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _process(self, image, timestamp):
+        """Rilevamento e stima della posa di un frame (eseguito sul thread di elaborazione)."""
+        self.pose_solver.next_frame()
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        corners, ids, _ = aruco.detectMarkers(gray, self.aruco_dict, parameters=self.parameters)
+        if ids is None:
+            return []
+        rvecs, tvecs = self.pose_solver.solve(corners, ids)
+        return [MarkerPose(int(ids[i][0]), rvecs[i], tvecs[i], corners[i], timestamp)
+                for i in range(len(rvecs))]
+
+    async def stream(self):
+        """
+        Generatore asincrono: produce, per ogni frame elaborato, la lista di
+        MarkerPose dei marker rilevati (vuota se nessun marker è visibile).
+
+        La sorgente viene avviata alla prima iterazione e fermata all'uscita dal
+        ciclo (break, cancellazione del task, eccezione o fine della sorgente).
+        Dopo un break il generatore viene chiuso dal garbage collector: per
+        fermare la sorgente subito usare contextlib.aclosing (Python >= 3.10):
+
+            async with contextlib.aclosing(engine.stream()) as stream:
+                async for poses in stream:
+                    ...
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            # L'avvio della pipeline RealSense è bloccante: lo eseguiamo fuori dal loop di eventi.
+            # È dentro il try: se il task viene cancellato durante l'avvio la sorgente viene comunque fermata.
+            await loop.run_in_executor(self._executor, self.source.start)
+            if self.camera_matrix is None:
+                self.camera_matrix, self.dist_coeffs = self.source.intrinsics()
+            self.pose_solver = WarmStartPoseSolver(self.marker_length, self.camera_matrix, self.dist_coeffs)
+
+            while True:
+                try:
+                    frame = self.source.poll()
+                except EOFError:
+                    return
+                if frame is None:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                image, timestamp = frame
+                yield await loop.run_in_executor(self._executor, self._process, image, timestamp)
+        finally:
+            # Anche l'arresto è bloccante. Sullo stesso thread viene eseguito dopo l'avvio o
+            # l'elaborazione ancora in corso; shield evita che una nuova cancellazione lo annulli.
+            await asyncio.shield(loop.run_in_executor(self._executor, self.source.stop))
+
+    def close(self):
+        """Arresta il thread di elaborazione."""
+        self._executor.shutdown(wait=True)
+
+
+async def _print_poses(engine):
+    async for poses in engine.stream():
+        for pose in poses:
+            x, y, z = pose.tvec[0]
+            print(f"[{pose.timestamp:.0f} ms] ID {pose.id}: ({x:.4f} m, {y:.4f} m, {z:.4f} m)")
+
+
+if __name__ == "__main__":
+    # Stampa le pose dalla RealSense usando gli intrinseci di fabbrica. Ctrl+C per uscire.
+    MARKER_LENGTH = 0.10  # Metri <-- MODIFICA QUESTO CON IL VALORE REALE DEL TUO MARKER
+    engine = PoseEngine(RealSenseFrameSource(), MARKER_LENGTH)
+    try:
+        asyncio.run(_print_poses(engine))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
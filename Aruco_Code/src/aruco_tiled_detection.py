@@ -0,0 +1,183 @@
+# Dipendenze necessarie:
+# pip install opencv-contrib-python
+# pip install numpy
+
+import numpy as np
+import cv2.aruco as aruco
+import os  # Per os.cpu_count()
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Rilevamento ArUco a tasselli (tiled) su più core ---
+# aruco.detectMarkers elabora l'intera immagine in una sola chiamata: con scene
+# dense ad alta risoluzione la maggior parte dei core resta inattiva.
+# Qui l'immagine viene divisa in tasselli sovrapposti, ogni tassello viene
+# elaborato su un thread del pool (OpenCV rilascia il GIL durante il calcolo)
+# e i duplicati nelle zone di sovrapposizione vengono eliminati per ID e
+# vicinanza degli angoli.
+
+# Griglia predefinita dei tasselli (righe, colonne).
+DEFAULT_TILE_GRID = (2, 2)
+
+# Sovrapposizione predefinita tra tasselli adiacenti in PIXEL.
+# DEVE essere maggiore del lato (in pixel) del marker più grande atteso,
+# altrimenti un marker a cavallo di un bordo potrebbe non essere contenuto
+# interamente in nessun tassello.
+DEFAULT_TILE_OVERLAP = 160
+
+# Distanza massima (in pixel) tra angoli corrispondenti perché due rilevamenti
+# con lo stesso ID siano considerati lo stesso marker.
+DEFAULT_DUPLICATE_DISTANCE = 4.0
+
+
+def compute_tiles(image_shape, grid=DEFAULT_TILE_GRID, overlap=DEFAULT_TILE_OVERLAP):
+    """
+    Calcola i rettangoli dei tasselli sovrapposti che coprono l'immagine.
+
+    Args:
+        image_shape (tuple): Forma dell'immagine (altezza, larghezza[, canali]).
+        grid (tuple): Numero di tasselli (righe, colonne).
+        overlap (int): Sovrapposizione tra tasselli adiacenti in pixel.
+
+    Returns:
+        list: Lista di tuple (x0, y0, x1, y1) in coordinate dell'immagine intera.
+    """
+    height, width = image_shape[:2]
+    rows, cols = grid
+    if rows < 1 or cols < 1:
+        raise ValueError(f"Griglia dei tasselli non valida: {grid}")
+
+    half_overlap = overlap // 2
+    tiles = []
+    for r in range(rows):
+        # Bordi "nominali" del tassello, poi estesi di metà sovrapposizione per lato
+        y0 = max(0, r * height // rows - half_overlap)
+        y1 = min(height, (r + 1) * height // rows + half_overlap)
+        for c in range(cols):
+            x0 = max(0, c * width // cols - half_overlap)
+            x1 = min(width, (c + 1) * width // cols + half_overlap)
+            tiles.append((x0, y0, x1, y1))
+    return tiles
+
+
+def _detect_in_tile(gray, tile, aruco_dict, parameters):
+    """
+    Esegue aruco.detectMarkers su un singolo tassello e riporta gli angoli
+    nelle coordinate dell'immagine intera.
+    """
+    x0, y0, x1, y1 = tile
+    # Lo slicing NumPy è una vista: nessuna copia dei pixel
+    corners, ids, _ = aruco.detectMarkers(gray[y0:y1, x0:x1], aruco_dict, parameters=parameters)
+    if ids is None:
+        return [], []
+    offset = np.array([x0, y0], dtype=np.float32)
+    return [c + offset for c in corners], [int(i[0]) for i in ids]
+
+
+def merge_detections(corners, ids, max_distance=DEFAULT_DUPLICATE_DISTANCE):
+    """
+    Rimuove i rilevamenti duplicati prodotti dalle zone di sovrapposizione.
+
+    Due rilevamenti sono duplicati se hanno lo stesso ID e tutti i loro angoli
+    corrispondenti distano meno di `max_distance` pixel. Marker con lo stesso
+    ID ma in posizioni diverse (ID ripetuti nella scena) vengono mantenuti.
+
+    Args:
+        corners (list): Lista di array (1, 4, 2) in coordinate dell'immagine intera.
+        ids (list): Lista di ID interi, parallela a `corners`.
+        max_distance (float): Soglia di vicinanza degli angoli in pixel.
+
+    Returns:
+        tuple: (corners, ids) nello stesso formato di aruco.detectMarkers,
+               con ids = None se non è stato trovato alcun marker.
+    """
+    kept_corners = []
+    kept_ids = []
+    for c, marker_id in zip(corners, ids):
+        duplicate = False
+        for kc, kid in zip(kept_corners, kept_ids):
+            if kid == marker_id and np.max(np.linalg.norm(kc - c, axis=2)) < max_distance:
+                duplicate = True
+                break
+        if not duplicate:
+            kept_corners.append(c)
+            kept_ids.append(marker_id)
+
+    if not kept_ids:
+        return (), None
+    return tuple(kept_corners), np.array(kept_ids, dtype=np.int32).reshape(-1, 1)
+
+
+class TiledArucoDetector:
+    """
+    Rilevatore ArUco che suddivide il frame in tasselli sovrapposti e li
+    elabora in parallelo su un pool di thread.
+
+    Il metodo detect() restituisce (corners, ids, rejected) come
+    aruco.detectMarkers, quindi può sostituirlo direttamente nei loop esistenti.
+    I candidati scartati non vengono uniti tra tasselli: rejected è sempre vuoto.
+
+    Nota: alcuni parametri del rilevatore (es. minMarkerPerimeterRate) sono
+    relativi alla dimensione dell'immagine elaborata; su un tassello la soglia
+    assoluta in pixel si riduce di conseguenza.
+    """
+
+    def __init__(self, aruco_dict, parameters, grid=DEFAULT_TILE_GRID,
+                 overlap=DEFAULT_TILE_OVERLAP, max_workers=None,
+                 duplicate_distance=DEFAULT_DUPLICATE_DISTANCE):
+        """
+        Args:
+            aruco_dict: Dizionario ArUco (aruco.getPredefinedDictionary).
+            parameters: aruco.DetectorParameters condivisi tra i tasselli.
+            grid (tuple): Numero di tasselli (righe, colonne).
+            overlap (int): Sovrapposizione tra tasselli adiacenti in pixel.
+            max_workers (int): Numero di thread; predefinito min(tasselli, core).
+            duplicate_distance (float): Soglia per la rimozione dei duplicati in pixel.
+        """
+        self.aruco_dict = aruco_dict
+        self.parameters = parameters
+        self.grid = grid
+        self.overlap = overlap
+        self.duplicate_distance = duplicate_distance
+        if max_workers is None:
+            max_workers = min(grid[0] * grid[1], os.cpu_count() or 1)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # I rettangoli dei tasselli dipendono solo dalla risoluzione: li teniamo in cache
+        self._tiles = None
+        self._tiles_shape = None
+
+    def detect(self, gray):
+        """
+        Rileva i marker ArUco nell'immagine in scala di grigi.
+
+        Args:
+            gray (numpy.ndarray): Immagine in scala di grigi (H, W).
+
+        Returns:
+            tuple: (corners, ids, rejected) nello stesso formato di aruco.detectMarkers.
+        """
+        if self._tiles_shape != gray.shape[:2]:
+            self._tiles = compute_tiles(gray.shape, self.grid, self.overlap)
+            self._tiles_shape = gray.shape[:2]
+
+        futures = [self._executor.submit(_detect_in_tile, gray, tile, self.aruco_dict, self.parameters)
+                   for tile in self._tiles]
+
+        all_corners = []
+        all_ids = []
+        for future in futures:
+            tile_corners, tile_ids = future.result()
+            all_corners.extend(tile_corners)
+            all_ids.extend(tile_ids)
+
+        corners, ids = merge_detections(all_corners, all_ids, self.duplicate_distance)
+        return corners, ids, ()
+
+    def close(self):
+        """Arresta il pool di thread."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,583 @@
+# Dipendenze necessarie:
+# pip install opencv-contrib-python
+# pip install numpy
+#
+# Benchmark su dati sintetici: NON richiede una telecamera RealSense.
+# Esempio:
+#   python src/benchmark_aruco.py tiled
+#   python src/benchmark_aruco.py alloc --frames 5000
+#   python src/benchmark_aruco.py pose --frames 300 --markers 8
+#   python src/benchmark_aruco.py gate --frames 600
+#   python src/benchmark_aruco.py stream --seconds 3
+#   python src/benchmark_aruco.py ir
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import cv2
+import cv2.aruco as aruco
+
+from aruco_tiled_detection import TiledArucoDetector
+from frame_buffers import FrameBuffers
+from aruco_pose_solver import WarmStartPoseSolver, marker_object_points, rotation_angle_between
+from motion_gate import MotionGate
+from aruco_pose_stream import PoseEngine, SyntheticFrameSource
+
+# Lato del marker usato per la stima della posa nei benchmark (metri)
+MARKER_LENGTH = 0.10
+
+# Dizionario usato dagli script live
+ARUCO_DICT = aruco.DICT_7X7_250
+
+
+def generate_marker_image(aruco_dict, marker_id, side_pixels):
+    """
+    Genera l'immagine di un singolo marker, compatibile con le diverse versioni di OpenCV.
+    """
+    if hasattr(aruco, 'generateImageMarker'):  # OpenCV >= 4.7
+        return aruco.generateImageMarker(aruco_dict, marker_id, side_pixels)
+    return aruco.drawMarker(aruco_dict, marker_id, side_pixels)
+
+
+def make_synthetic_scene(width, height, marker_count, aruco_dict, max_side=200, seed=0):
+    """
+    Crea un'immagine in scala di grigi con `marker_count` marker disposti su una griglia.
+    Il lato dei marker è limitato a `max_side` pixel, così che ogni marker
+    rientri interamente nella sovrapposizione tra tasselli.
+
+    Returns:
+        numpy.ndarray: Immagine (height, width) uint8 con sfondo bianco.
+    """
+    rng = np.random.default_rng(seed)
+    scene = np.full((height, width), 255, dtype=np.uint8)
+    cols = int(np.ceil(np.sqrt(marker_count * width / height)))
+    rows = int(np.ceil(marker_count / cols))
+    cell_w = width // cols
+    cell_h = height // rows
+    # Lato del marker: 60% della cella, con un margine bianco attorno
+    side = min(int(min(cell_w, cell_h) * 0.6), max_side)
+    ids = rng.choice(250, size=marker_count, replace=False)
+    for n, marker_id in enumerate(ids):
+        r, c = divmod(n, cols)
+        x = c * cell_w + (cell_w - side) // 2
+        y = r * cell_h + (cell_h - side) // 2
+        scene[y:y + side, x:x + side] = generate_marker_image(aruco_dict, int(marker_id), side)
+    return scene
+
+
+def synthetic_camera_matrix(width, height):
+    """Matrice intrinseca plausibile per una RealSense alla risoluzione data (senza distorsione)."""
+    focal = 0.7 * width
+    camera_matrix = np.array([[focal, 0, width / 2.0],
+                              [0, focal, height / 2.0],
+                              [0, 0, 1]], dtype=np.float64)
+    return camera_matrix, np.zeros(5, dtype=np.float64)
+
+
+def time_call(fn, repeats):
+    """Restituisce il tempo mediano (in ms) di `repeats` chiamate a fn()."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(times))
+
+
+def benchmark_tiled(args):
+    """
+    Confronta aruco.detectMarkers (chiamata singola) con TiledArucoDetector
+    al crescere del numero di marker e della risoluzione.
+    Lo speedup dipende dai core disponibili: detectMarkers usa già in parte
+    il parallelismo interno di OpenCV (cv2.getNumThreads()).
+    """
+    aruco_dict = aruco.getPredefinedDictionary(ARUCO_DICT)
+    parameters = aruco.DetectorParameters()
+    grid = (args.rows, args.cols)
+
+    print(f"Core disponibili: {os.cpu_count()}, thread OpenCV: {cv2.getNumThreads()}")
+    print(f"Griglia tasselli: {grid}, sovrapposizione: {args.overlap} px, ripetizioni: {args.repeats}")
+    print(f"{'Risoluzione':>12} {'Marker':>7} {'Singola (ms)':>13} {'Tiled (ms)':>11} {'Speedup':>8} {'Trovati S/T':>12}")
+
+    with TiledArucoDetector(aruco_dict, parameters, grid=grid, overlap=args.overlap) as tiled:
+        for width, height in [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]:
+            for marker_count in [4, 16, 64]:
+                gray = make_synthetic_scene(width, height, marker_count, aruco_dict)
+
+                _, single_ids, _ = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+                _, tiled_ids, _ = tiled.detect(gray)
+
+                single_ms = time_call(lambda: aruco.detectMarkers(gray, aruco_dict, parameters=parameters), args.repeats)
+                tiled_ms = time_call(lambda: tiled.detect(gray), args.repeats)
+
+                found_single = 0 if single_ids is None else len(single_ids)
+                found_tiled = 0 if tiled_ids is None else len(tiled_ids)
+                print(f"{width:>5}x{height:<6} {marker_count:>7} {single_ms:>13.2f} {tiled_ms:>11.2f} "
+                      f"{single_ms / tiled_ms:>7.2f}x {found_single:>5}/{found_tiled:<6}")
+
+
+def estimate_pose_single_markers(corners, camera_matrix, dist_coeffs):
+    """
+    aruco.estimatePoseSingleMarkers, o la sua implementazione equivalente
+    (solvePnP ITERATIVE per marker) sulle versioni di OpenCV che l'hanno rimossa.
+    """
+    if hasattr(aruco, 'estimatePoseSingleMarkers'):
+        rvecs, tvecs, _ = aruco.estimatePoseSingleMarkers(corners, MARKER_LENGTH, camera_matrix, dist_coeffs)
+        return rvecs, tvecs
+    object_points = marker_object_points(MARKER_LENGTH)
+    rvecs = np.zeros((len(corners), 1, 3), dtype=np.float64)
+    tvecs = np.zeros((len(corners), 1, 3), dtype=np.float64)
+    for i, c in enumerate(corners):
+        _, rvec, tvec = cv2.solvePnP(object_points, c, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE)
+        rvecs[i, 0] = rvec.ravel()
+        tvecs[i, 0] = tvec.ravel()
+    return rvecs, tvecs
+
+
+def _allocating_step(color_image, aruco_dict, parameters, pose_solver):
+    """Un'iterazione del loop live senza buffer: ogni risultato è un nuovo array."""
+    gray = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
+    corners, ids, _ = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+    if ids is not None:
+        rvecs, tvecs = pose_solver.solve(corners, ids)
+        for i in range(len(rvecs)):
+            rotation_matrix, _ = cv2.Rodrigues(rvecs[i])
+
+
+def _buffered_step(color_image, aruco_dict, parameters, buffers, pose_solver):
+    """La stessa iterazione scrivendo nei buffer preallocati di FrameBuffers."""
+    gray = buffers.to_gray(color_image)
+    corners, ids, _ = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+    if ids is not None:
+        rvecs, tvecs = pose_solver.solve(corners, ids, buffers.rvecs, buffers.tvecs)
+        for i in range(len(rvecs)):
+            rotation_matrix = buffers.rodrigues(rvecs[i])
+
+
+def _measure_loop(step, frames, warmup):
+    """
+    Esegue `step` per `frames` iterazioni e misura:
+    - tempi per frame (senza tracemalloc, che rallenta l'esecuzione);
+    - crescita della memoria e picco transitorio con tracemalloc;
+    - numero di raccolte del garbage collector (generazione 0).
+    """
+    for _ in range(warmup):
+        step()
+
+    times = np.empty(frames, dtype=np.float64)
+    gc_before = gc.get_stats()[0]['collections']
+    for n in range(frames):
+        start = time.perf_counter()
+        step()
+        times[n] = (time.perf_counter() - start) * 1000.0
+    gc_collections = gc.get_stats()[0]['collections'] - gc_before
+
+    tracemalloc.start()
+    for _ in range(warmup):
+        step()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(frames):
+        step()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p99 = np.percentile(times, [50, 99])
+    return {
+        'p50': p50, 'p99': p99, 'jitter': p99 - p50,
+        'growth': current - baseline, 'peak': peak - baseline,
+        'gc': gc_collections,
+    }
+
+
+def benchmark_alloc(args):
+    """
+    Confronta il loop originale (nuovi array ad ogni frame) con il loop a buffer
+    preallocati. Misura le allocazioni con tracemalloc su `--frames` frame e il
+    jitter (p99 - p50) del tempo per frame.
+
+    "Crescita" è la memoria trattenuta alla fine della misura, "Picco" la
+    massima memoria transitoria allocata sopra il livello a regime: per il loop
+    originale include l'immagine grigia e i vettori di posa allocati ad ogni
+    frame. In entrambi i loop l'overlay si disegna direttamente sul frame.
+    Termina con codice 1 se il picco del loop a buffer supera `--max-peak-kb`:
+    il comando può quindi essere usato come verifica automatica.
+    Nota: tracemalloc traccia le allocazioni Python/NumPy, non quelle interne
+    di OpenCV in C++.
+    """
+    aruco_dict = aruco.getPredefinedDictionary(ARUCO_DICT)
+    parameters = aruco.DetectorParameters()
+    width, height = args.width, args.height
+    gray = make_synthetic_scene(width, height, args.markers, aruco_dict)
+    color_image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    camera_matrix, dist_coeffs = synthetic_camera_matrix(width, height)
+    buffers = FrameBuffers(width, height)
+    # Stesso solver nei due loop (istanze separate: ognuna mantiene le proprie pose)
+    allocating_solver = WarmStartPoseSolver(MARKER_LENGTH, camera_matrix, dist_coeffs)
+    buffered_solver = WarmStartPoseSolver(MARKER_LENGTH, camera_matrix, dist_coeffs)
+
+    results = {
+        'Allocante': _measure_loop(
+            lambda: _allocating_step(color_image, aruco_dict, parameters, allocating_solver),
+            args.frames, args.warmup),
+        'Buffer': _measure_loop(
+            lambda: _buffered_step(color_image, aruco_dict, parameters, buffers, buffered_solver),
+            args.frames, args.warmup),
+    }
+
+    print(f"Frame: {args.frames} a {width}x{height}, marker: {args.markers}")
+    print(f"{'Loop':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'Jitter (ms)':>12} {'Crescita (KB)':>14} {'Picco (KB)':>11} {'GC gen0':>8}")
+    for name, r in results.items():
+        print(f"{name:>10} {r['p50']:>9.2f} {r['p99']:>9.2f} {r['jitter']:>12.2f} "
+              f"{r['growth'] / 1024:>14.1f} {r['peak'] / 1024:>11.1f} {r['gc']:>8}")
+
+    peak_kb = results['Buffer']['peak'] / 1024
+    if peak_kb > args.max_peak_kb:
+        print(f"FALLITO: allocazioni a regime del loop a buffer {peak_kb:.1f} KB > {args.max_peak_kb} KB")
+        sys.exit(1)
+    print(f"OK: allocazioni a regime del loop a buffer {peak_kb:.1f} KB <= {args.max_peak_kb} KB")
+
+
+def make_synthetic_pose_sequence(frames, marker_count, camera_matrix, dist_coeffs, noise_px, seed=0):
+    """
+    Genera una sequenza sintetica di angoli di marker in movimento lento.
+
+    Ogni marker oscilla attorno alla vista frontale (dove l'ambiguità di flip è
+    più forte) e trasla lentamente; agli angoli proiettati si aggiunge rumore
+    gaussiano di deviazione standard `noise_px` pixel.
+
+    Returns:
+        list: Per ogni frame, una tupla (corners, ids, true_rvecs, true_tvecs).
+    """
+    rng = np.random.default_rng(seed)
+    object_points = marker_object_points(MARKER_LENGTH)
+    phases = rng.uniform(0, 2 * np.pi, size=(marker_count, 3))
+    centers = np.column_stack([rng.uniform(-0.25, 0.25, marker_count),
+                               rng.uniform(-0.15, 0.15, marker_count),
+                               rng.uniform(0.6, 1.2, marker_count)])
+    ids = np.arange(marker_count, dtype=np.int32).reshape(-1, 1)
+    sequence = []
+    for n in range(frames):
+        t = n / 30.0
+        corners = []
+        true_rvecs = np.zeros((marker_count, 3))
+        true_tvecs = np.zeros((marker_count, 3))
+        for m in range(marker_count):
+            # Rotazione di 180° attorno a X (marker frontale) più una piccola oscillazione
+            tilt = 0.15 * np.sin(t + phases[m, 0])
+            rotation = cv2.Rodrigues(np.array([np.pi, 0.0, 0.0]))[0] @ \
+                cv2.Rodrigues(np.array([tilt, 0.5 * tilt, 0.3 * np.sin(0.5 * t + phases[m, 2])]))[0]
+            rvec = cv2.Rodrigues(rotation)[0].ravel()
+            tvec = centers[m] + 0.02 * np.sin(t + phases[m])
+            projected, _ = cv2.projectPoints(object_points, rvec, tvec, camera_matrix, dist_coeffs)
+            projected = projected.reshape(1, 4, 2) + rng.normal(0, noise_px, size=(1, 4, 2))
+            corners.append(projected.astype(np.float32))
+            true_rvecs[m] = rvec
+            true_tvecs[m] = tvec
+        sequence.append((tuple(corners), ids, true_rvecs, true_tvecs))
+    return sequence
+
+
+def benchmark_pose(args):
+    """
+    Confronta su sequenze sintetiche la funzione deprecata, IPPE_SQUARE senza
+    memoria e WarmStartPoseSolver (predefinito, con la sola disambiguazione del
+    flip, e con warm_start=True).
+    Riporta il tempo per marker, l'errore medio e il numero di "flip" (errore di
+    rotazione > 20° rispetto alla posa vera).
+    """
+    camera_matrix, dist_coeffs = synthetic_camera_matrix(1280, 720)
+    sequence = make_synthetic_pose_sequence(args.frames, args.markers, camera_matrix, dist_coeffs, args.noise)
+    object_points = marker_object_points(MARKER_LENGTH)
+
+    def ippe_cold(corners, ids):
+        rvecs = np.zeros((len(corners), 1, 3))
+        tvecs = np.zeros((len(corners), 1, 3))
+        for i, c in enumerate(corners):
+            _, rvec, tvec = cv2.solvePnP(object_points, c, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_IPPE_SQUARE)
+            rvecs[i, 0] = rvec.ravel()
+            tvecs[i, 0] = tvec.ravel()
+        return rvecs, tvecs
+
+    warm_solver = WarmStartPoseSolver(MARKER_LENGTH, camera_matrix, dist_coeffs, warm_start=True)
+    ippe_temporal_solver = WarmStartPoseSolver(MARKER_LENGTH, camera_matrix, dist_coeffs)
+    methods = {
+        'estimatePoseSingleMarkers': lambda c, i: estimate_pose_single_markers(c, camera_matrix, dist_coeffs),
+        'IPPE_SQUARE (senza memoria)': ippe_cold,
+        'Solver (solo disambiguazione)': ippe_temporal_solver.solve,
+        'Solver (warm start)': warm_solver.solve,
+    }
+
+    print(f"Frame: {args.frames}, marker: {args.markers}, rumore: {args.noise} px")
+    print(f"{'Metodo':>30} {'us/marker':>10} {'Rot. (deg)':>11} {'Trasl. (mm)':>12} {'Flip':>6}")
+    for name, solve in methods.items():
+        elapsed = 0.0
+        rotation_errors = []
+        translation_errors = []
+        for corners, ids, true_rvecs, true_tvecs in sequence:
+            start = time.perf_counter()
+            rvecs, tvecs = solve(corners, ids)
+            elapsed += time.perf_counter() - start
+            for m in range(len(corners)):
+                rotation_errors.append(np.degrees(rotation_angle_between(rvecs[m].reshape(3, 1), true_rvecs[m])))
+                translation_errors.append(np.linalg.norm(tvecs[m].ravel() - true_tvecs[m]) * 1000.0)
+        rotation_errors = np.array(rotation_errors)
+        flips = int(np.sum(rotation_errors > 20.0))
+        us_per_marker = elapsed / (args.frames * args.markers) * 1e6
+        print(f"{name:>30} {us_per_marker:>10.1f} {np.mean(rotation_errors):>11.2f} "
+              f"{np.mean(translation_errors):>12.2f} {flips:>6}")
+    print(f"Solver warm start: {warm_solver.stats}")
+
+
+def benchmark_gate(args):
+    """
+    Misura il rilevamento condizionato al movimento su una sequenza sintetica
+    di una cella per lo più statica: la scena resta ferma, con rumore del
+    sensore, e a intervalli regolari un marker si sposta per `--move-frames`
+    frame. Il tempo è simulato a 30 fps per la scadenza di `--max-interval`.
+    """
+    aruco_dict = aruco.getPredefinedDictionary(ARUCO_DICT)
+    parameters = aruco.DetectorParameters()
+    width, height = 1280, 720
+    camera_matrix, dist_coeffs = synthetic_camera_matrix(width, height)
+    rng = np.random.default_rng(0)
+
+    base = make_synthetic_scene(width, height, args.markers, aruco_dict)
+    moving = generate_marker_image(aruco_dict, 249, 120)
+    # Prepara i frame in anticipo, così il loop misura solo l'elaborazione
+    frames = []
+    changed = []
+    for n in range(args.frames):
+        gray = base.copy()
+        phase = n % args.period
+        if phase < args.move_frames:
+            x = 40 + 8 * phase
+            gray[height - 160:height - 40, x:x + 120] = moving
+        noise = rng.normal(0, args.noise, size=gray.shape)
+        gray = np.clip(gray + noise, 0, 255).astype(np.uint8)
+        frames.append(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+        changed.append(phase < args.move_frames + 1)
+
+    def full_pipeline(color_image, pose_solver):
+        pose_solver.next_frame()
+        gray = cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
+        corners, ids, _ = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+        rvecs = tvecs = None
+        if ids is not None:
+            rvecs, tvecs = pose_solver.solve(corners, ids)
+        return corners, ids, rvecs, tvecs
+
+    # Senza gate
+    pose_solver = WarmStartPoseSolver(MARKER_LENGTH, camera_matrix, dist_coeffs)
+    start = time.perf_counter()
+    for color_image in frames:
+        full_pipeline(color_image, pose_solver)
+    ungated_seconds = time.perf_counter() - start
+
+    # Con gate
+    clock_time = [0.0]
+    motion_gate = MotionGate(max_interval=args.max_interval, clock=lambda: clock_time[0])
+    pose_solver = WarmStartPoseSolver(MARKER_LENGTH, camera_matrix, dist_coeffs)
+    stale = 0
+    start = time.perf_counter()
+    for n, color_image in enumerate(frames):
+        clock_time[0] = n / 30.0
+        if motion_gate.check(color_image):
+            detection_start = time.perf_counter()
+            corners, ids, rvecs, tvecs = full_pipeline(color_image, pose_solver)
+            motion_gate.update(corners, ids, rvecs, tvecs, clock_time[0], time.perf_counter() - detection_start)
+        else:
+            pose_solver.next_frame()
+            if changed[n]:
+                stale += 1
+    gated_seconds = time.perf_counter() - start
+
+    gate_stats = motion_gate.stats()
+    print(f"Frame: {args.frames} a {width}x{height}, marker statici: {args.markers}, "
+          f"movimento: {args.move_frames} frame ogni {args.period}")
+    print(f"Senza gate: {ungated_seconds / args.frames * 1000:.2f} ms/frame")
+    print(f"Con gate:   {gated_seconds / args.frames * 1000:.2f} ms/frame "
+          f"(costo gate {gate_stats['gate_ms']:.3f} ms/frame)")
+    print(f"Hit rate: {gate_stats['hit_rate']:.1%} (cache {gate_stats['hits']}, variazione {gate_stats['misses']}, "
+          f"forzati {gate_stats['forced']}), CPU risparmiata stimata: {gate_stats['saved_s']:.2f} s")
+    print(f"Frame in movimento serviti dalla cache: {stale}")
+
+
+async def _consume_stream(engine, seconds, consumer_delay, cancel_after):
+    """
+    Consuma lo stream per `seconds` secondi simulando un consumatore che impiega
+    `consumer_delay` secondi per ogni lista di pose; con `cancel_after` il task
+    viene cancellato dopo quel numero di frame.
+    Restituisce (frame ricevuti, pose ricevute, massimo ritardo del loop di eventi in ms).
+    """
+    received = [0, 0]
+
+    async def consumer():
+        async with contextlib.aclosing(engine.stream()) as stream:
+            async for poses in stream:
+                received[0] += 1
+                received[1] += len(poses)
+                await asyncio.sleep(consumer_delay)
+
+    async def heartbeat(stop_event, lags):
+        # Misura quanto il loop di eventi resta bloccato: deve restare reattivo durante l'elaborazione
+        while not stop_event.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append((time.perf_counter() - start - 0.001) * 1000.0)
+
+    stop_event = asyncio.Event()
+    lags = []
+    heartbeat_task = asyncio.create_task(heartbeat(stop_event, lags))
+    consumer_task = asyncio.create_task(consumer())
+    start = time.monotonic()
+    while not consumer_task.done() and time.monotonic() - start < seconds:
+        if cancel_after is not None and received[0] >= cancel_after:
+            break
+        await asyncio.sleep(0.01)
+    consumer_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await consumer_task
+    stop_event.set()
+    await heartbeat_task
+    return received[0], received[1], max(lags) if lags else 0.0
+
+
+def benchmark_stream(args):
+    """
+    Esercita PoseEngine.stream() su una sorgente sintetica a `--fps`, senza
+    telecamera: throughput, frame scartati per backpressure con un consumatore
+    lento, reattività del loop di eventi e arresto della sorgente alla cancellazione.
+    """
+    aruco_dict = aruco.getPredefinedDictionary(ARUCO_DICT)
+    width, height = 1280, 720
+    camera_matrix, dist_coeffs = synthetic_camera_matrix(width, height)
+    images = [cv2.cvtColor(make_synthetic_scene(width, height, args.markers, aruco_dict, seed=n), cv2.COLOR_GRAY2BGR)
+              for n in range(4)]
+
+    print(f"Sorgente sintetica a {args.fps} fps, {width}x{height}, marker: {args.markers}")
+    print(f"{'Scenario':>28} {'Frame':>6} {'Pose':>6} {'Scartati':>9} {'Lag loop (ms)':>14} {'Sorgente fermata':>17}")
+    scenarios = [
+        ('Consumatore veloce', 0.0, None),
+        (f"Consumatore lento ({args.slow_ms} ms)", args.slow_ms / 1000.0, None),
+        ('Cancellazione dopo 10 frame', 0.0, 10),
+    ]
+    for name, consumer_delay, cancel_after in scenarios:
+        source = SyntheticFrameSource(images, fps=args.fps, loop=True,
+                                      camera_matrix=camera_matrix, dist_coeffs=dist_coeffs)
+        engine = PoseEngine(source, MARKER_LENGTH, ARUCO_DICT)
+        frames, poses, max_lag = asyncio.run(_consume_stream(engine, args.seconds, consumer_delay, cancel_after))
+        engine.close()
+        print(f"{name:>28} {frames:>6} {poses:>6} {source.dropped:>9} {max_lag:>14.2f} {str(source.stopped):>17}")
+
+
+def benchmark_ir(args):
+    """
+    Confronta per frame il percorso a colori (BGR8 -> cvtColor -> detectMarkers)
+    con quello infrarosso Y8 (vista diretta -> detectMarkers), su dati Y8
+    sintetici o su un file .npy registrato (`--y8-file`, array (H, W) uint8).
+
+    Il buffer del frame è simulato con un bytearray, come quello restituito da
+    frame.get_data(): np.frombuffer ne crea una vista senza copie.
+    """
+    aruco_dict = aruco.getPredefinedDictionary(ARUCO_DICT)
+    parameters = aruco.DetectorParameters()
+
+    if args.y8_file:
+        recorded = np.load(args.y8_file)
+        scenes = {'Registrato': recorded}
+    else:
+        scenes = {f"{w}x{h}": make_synthetic_scene(w, h, args.markers, aruco_dict)
+                  for w, h in [(1280, 720), (848, 480)]}
+
+    print(f"Ripetizioni: {args.repeats}, byte/s calcolati a {args.fps} fps")
+    print(f"{'Formato':>18} {'Byte/frame':>11} {'MB/s':>7} {'Conv. (ms)':>11} {'Detect (ms)':>12} {'Totale (ms)':>12} {'Trovati':>8}")
+    for name, gray_scene in scenes.items():
+        height, width = gray_scene.shape
+        bgr_buffer = bytearray(cv2.cvtColor(gray_scene, cv2.COLOR_GRAY2BGR).tobytes())
+        y8_buffer = bytearray(gray_scene.tobytes())
+
+        def bgr_convert():
+            color_image = np.frombuffer(bgr_buffer, dtype=np.uint8).reshape(height, width, 3)
+            return cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY)
+
+        def y8_view():
+            return np.frombuffer(y8_buffer, dtype=np.uint8).reshape(height, width)
+
+        assert np.shares_memory(y8_view(), np.frombuffer(y8_buffer, dtype=np.uint8))
+
+        for label, frame_bytes, get_gray in [(f"BGR8 {name}", len(bgr_buffer), bgr_convert),
+                                             (f"Y8 {name}", len(y8_buffer), y8_view)]:
+            gray = get_gray()
+            convert_ms = time_call(get_gray, args.repeats)
+            detect_ms = time_call(lambda: aruco.detectMarkers(gray, aruco_dict, parameters=parameters), args.repeats)
+            total_ms = time_call(lambda: aruco.detectMarkers(get_gray(), aruco_dict, parameters=parameters),
+                                 args.repeats)
+            _, ids, _ = aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+            found = 0 if ids is None else len(ids)
+            print(f"{label:>18} {frame_bytes:>11} {frame_bytes * args.fps / 1e6:>7.1f} {convert_ms:>11.3f} "
+                  f"{detect_ms:>12.2f} {total_ms:>12.2f} {found:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark della pipeline ArUco su dati sintetici.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    tiled_parser = subparsers.add_parser('tiled', help="Rilevamento a tasselli multi-core vs chiamata singola")
+    tiled_parser.add_argument('--rows', type=int, default=2, help="Righe della griglia di tasselli")
+    tiled_parser.add_argument('--cols', type=int, default=2, help="Colonne della griglia di tasselli")
+    tiled_parser.add_argument('--overlap', type=int, default=240, help="Sovrapposizione tra tasselli in pixel")
+    tiled_parser.add_argument('--repeats', type=int, default=10, help="Ripetizioni per ogni misura")
+    tiled_parser.set_defaults(func=benchmark_tiled)
+
+    alloc_parser = subparsers.add_parser('alloc', help="Allocazioni e jitter: loop originale vs buffer preallocati")
+    alloc_parser.add_argument('--frames', type=int, default=2000, help="Frame misurati per ogni loop")
+    alloc_parser.add_argument('--warmup', type=int, default=50, help="Frame di riscaldamento non misurati")
+    alloc_parser.add_argument('--width', type=int, default=1280, help="Larghezza del frame sintetico")
+    alloc_parser.add_argument('--height', type=int, default=720, help="Altezza del frame sintetico")
+    alloc_parser.add_argument('--markers', type=int, default=8, help="Marker nella scena sintetica")
+    alloc_parser.add_argument('--max-peak-kb', type=float, default=64.0,
+                              help="Picco massimo di allocazioni tollerato a regime per il loop a buffer (KB)")
+    alloc_parser.set_defaults(func=benchmark_alloc)
+
+    pose_parser = subparsers.add_parser('pose', help="Stima della posa: funzione deprecata vs IPPE_SQUARE vs WarmStartPoseSolver")
+    pose_parser.add_argument('--frames', type=int, default=300, help="Frame della sequenza sintetica")
+    pose_parser.add_argument('--markers', type=int, default=8, help="Marker per frame")
+    pose_parser.add_argument('--noise', type=float, default=0.3, help="Rumore sugli angoli in pixel")
+    pose_parser.set_defaults(func=benchmark_pose)
+
+    gate_parser = subparsers.add_parser('gate', help="Rilevamento condizionato al movimento su una scena statica")
+    gate_parser.add_argument('--frames', type=int, default=600, help="Frame della sequenza sintetica")
+    gate_parser.add_argument('--markers', type=int, default=8, help="Marker statici nella scena")
+    gate_parser.add_argument('--period', type=int, default=150, help="Periodo (frame) tra due movimenti")
+    gate_parser.add_argument('--move-frames', type=int, default=20, help="Durata (frame) di ogni movimento")
+    gate_parser.add_argument('--noise', type=float, default=1.5, help="Rumore del sensore (livelli di grigio)")
+    gate_parser.add_argument('--max-interval', type=float, default=1.0, help="Secondi massimi tra due rilevamenti")
+    gate_parser.set_defaults(func=benchmark_gate)
+
+    stream_parser = subparsers.add_parser('stream', help="Stream asyncio delle pose su una sorgente sintetica")
+    stream_parser.add_argument('--seconds', type=float, default=3.0, help="Durata di ogni scenario")
+    stream_parser.add_argument('--fps', type=int, default=30, help="Frame rate della sorgente sintetica")
+    stream_parser.add_argument('--markers', type=int, default=8, help="Marker nella scena sintetica")
+    stream_parser.add_argument('--slow-ms', type=int, default=100, help="Tempo per frame del consumatore lento")
+    stream_parser.set_defaults(func=benchmark_stream)
+
+    ir_parser = subparsers.add_parser('ir', help="Percorso infrarosso Y8 vs colore BGR8 + cvtColor")
+    ir_parser.add_argument('--y8-file', help="File .npy con un frame Y8 registrato (H, W) uint8")
+    ir_parser.add_argument('--markers', type=int, default=8, help="Marker nella scena sintetica")
+    ir_parser.add_argument('--fps', type=int, default=30, help="Frame rate per il calcolo della banda")
+    ir_parser.add_argument('--repeats', type=int, default=50, help="Ripetizioni per ogni misura")
+    ir_parser.set_defaults(func=benchmark_ir)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Dipendenze necessarie:
+# pip install opencv-contrib-python
+# pip install numpy
+
+import numpy as np
+import cv2
+
+# --- Buffer preallocati per un loop senza allocazioni a regime ---
+# Ad ogni iterazione i loop live allocano una nuova immagine in scala di grigi,
+# nuovi array rvec/tvec, una matrice di rotazione per marker e un frameset
+# allineato. FrameBuffers alloca tutto una sola volta e le funzioni OpenCV
+# scrivono direttamente nei buffer (argomento dst/out).
+
+# Numero massimo predefinito di marker per frame gestiti dai buffer di posa.
+DEFAULT_MAX_MARKERS = 64
+
+
+class FrameBuffers:
+    """
+    Insieme di buffer riutilizzati ad ogni frame dal loop di stima della posa.
+
+    Attributi:
+        gray (numpy.ndarray): Immagine in scala di grigi (H, W) uint8.
+        canvas (numpy.ndarray): Immagine BGR (H, W, 3) uint8 per l'overlay dei frame in
+                                scala di grigi, allocata al primo overlay_gray() (i frame
+                                BGR si disegnano direttamente); None fino ad allora.
+        rvecs (numpy.ndarray): Vettori di rotazione (max_markers, 1, 3) float64.
+        tvecs (numpy.ndarray): Vettori di traslazione (max_markers, 1, 3) float64.
+        rotation (numpy.ndarray): Matrice di rotazione (3, 3) float64.
+    """
+
+    def __init__(self, width, height, max_markers=DEFAULT_MAX_MARKERS):
+        """
+        Args:
+            width (int): Larghezza del frame in pixel.
+            height (int): Altezza del frame in pixel.
+            max_markers (int): Capacità dei buffer di posa; i marker in eccesso vengono ignorati.
+        """
+        self.max_markers = max_markers
+        self.gray = np.empty((height, width), dtype=np.uint8)
+        self.canvas = None
+        # Stessa forma (N, 1, 3) di aruco.estimatePoseSingleMarkers: il codice di disegno non cambia.
+        # Vengono riempiti da WarmStartPoseSolver.solve(..., rvecs_out, tvecs_out).
+        self.rvecs = np.zeros((max_markers, 1, 3), dtype=np.float64)
+        self.tvecs = np.zeros((max_markers, 1, 3), dtype=np.float64)
+        self.rotation = np.empty((3, 3), dtype=np.float64)
+
+    def _check_size(self, image):
+        # Con dimensioni diverse OpenCV allocherebbe un nuovo array lasciando il buffer invariato
+        if image.shape[:2] != self.gray.shape:
+            raise ValueError(f"Frame {image.shape[1]}x{image.shape[0]} diverso dai buffer "
+                             f"{self.gray.shape[1]}x{self.gray.shape[0]}")
+
+    def to_gray(self, color_image):
+        """Converte il frame BGR in scala di grigi scrivendo nel buffer `gray`."""
+        self._check_size(color_image)
+        cv2.cvtColor(color_image, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        return self.gray
+
+    def overlay_gray(self, gray_image):
+        """Converte un frame in scala di grigi (es. infrarosso Y8) in BGR nel buffer `canvas`."""
+        self._check_size(gray_image)
+        if self.canvas is None:
+            self.canvas = np.empty(self.gray.shape + (3,), dtype=np.uint8)
+        cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR, dst=self.canvas)
+        return self.canvas
+
+    def rodrigues(self, rvec):
+        """Converte rvec in matrice di rotazione scrivendo nel buffer `rotation`."""
+        cv2.Rodrigues(rvec, self.rotation)
+        return self.rotation
@@ -0,0 +1,213 @@
+# Dipendenze necessarie:
+# pip install opencv-contrib-python
+# pip install numpy
+
+import time
+import numpy as np
+import cv2
+
+# --- Rilevamento condizionato al movimento ---
+# Su celle statiche la telecamera inquadra la stessa scena per minuti, ma ogni
+# frame passa comunque da cvtColor -> detectMarkers -> stima della posa.
+# MotionGate confronta una versione sottocampionata del frame con quella
+# dell'ultimo frame elaborato completamente, usando un segnale di variazione
+# molto economico: i pixel cambiati sull'intero frame e la differenza media
+# nella ROI di ogni marker. Se nulla è cambiato il loop riutilizza i risultati
+# in cache con il loro timestamp originale; un rilevamento completo viene
+# comunque forzato ogni `max_interval` secondi.
+
+# Fattore di sottocampionamento del frame per il calcolo della differenza.
+DEFAULT_GATE_SCALE = 0.125
+
+# Differenza (livelli di grigio, 0-255) oltre la quale un pixel sottocampionato è
+# considerato cambiato. Il sottocampionamento INTER_AREA media il rumore del sensore,
+# che resta ben al di sotto di questa soglia.
+DEFAULT_PIXEL_THRESHOLD = 10
+
+# Numero di pixel sottocampionati cambiati oltre il quale il frame è considerato cambiato.
+# Un conteggio, e non la differenza media globale, non diluisce un oggetto piccolo
+# in movimento nel resto del frame.
+DEFAULT_MIN_CHANGED_PIXELS = 2
+
+# Differenza media nella ROI di un marker oltre la quale il frame è considerato cambiato.
+# Coglie variazioni lievi ma diffuse sul marker (es. piccole rotazioni o cambi di
+# illuminazione) che non superano la soglia per singolo pixel.
+DEFAULT_ROI_THRESHOLD = 4.0
+
+# Intervallo massimo (secondi) tra due rilevamenti completi.
+DEFAULT_MAX_INTERVAL = 1.0
+
+# Margine (pixel, alla risoluzione piena) aggiunto attorno alla ROI di ogni marker.
+ROI_MARGIN = 16
+
+
+class MotionGate:
+    """
+    Decide per ogni frame se rieseguire rilevamento e stima della posa o
+    riutilizzare i risultati dell'ultimo frame elaborato.
+
+    Uso tipico nel loop:
+        if motion_gate.check(image):
+            ... rilevamento completo ...
+            motion_gate.update(corners, ids, rvecs, tvecs, timestamp, elapsed)
+        else:
+            corners, ids, rvecs, tvecs, timestamp = motion_gate.cached
+
+    Attributi:
+        hits (int): Frame in cui la cache è stata riutilizzata.
+        misses (int): Frame elaborati completamente per variazione della scena.
+        forced (int): Frame elaborati completamente per scadenza di `max_interval`
+                      o per assenza di un riferimento.
+    """
+
+    def __init__(self, scale=DEFAULT_GATE_SCALE, pixel_threshold=DEFAULT_PIXEL_THRESHOLD,
+                 min_changed_pixels=DEFAULT_MIN_CHANGED_PIXELS, roi_threshold=DEFAULT_ROI_THRESHOLD,
+                 max_interval=DEFAULT_MAX_INTERVAL, clock=time.monotonic):
+        """
+        Args:
+            scale (float): Fattore di sottocampionamento (es. 0.125 = 1/8 per lato).
+            pixel_threshold (int): Soglia di differenza per considerare cambiato un pixel sottocampionato.
+            min_changed_pixels (int): Pixel cambiati oltre i quali il frame è considerato cambiato.
+            roi_threshold (float): Soglia sulla differenza media nella ROI di ogni marker.
+            max_interval (float): Secondi massimi tra due rilevamenti completi.
+            clock (callable): Sorgente del tempo in secondi (sostituibile nei benchmark).
+        """
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_pixels = min_changed_pixels
+        self.roi_threshold = roi_threshold
+        self.max_interval = max_interval
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.forced = 0
+        self.cached = None
+        # Buffer sottocampionati, allocati al primo frame
+        self._small = None
+        self._small_gray = None
+        self._reference = None
+        self._diff = None
+        self._mask = None
+        self._image_shape = None
+        self._rois = []
+        self._last_full = None
+        self._pending = False
+        # Tempi per la stima della CPU risparmiata
+        self._gate_seconds = 0.0
+        self._full_seconds = 0.0
+
+    def _allocate(self, image):
+        height, width = image.shape[:2]
+        small_size = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        if image.ndim == 3:
+            self._small = np.empty((small_size[1], small_size[0], image.shape[2]), dtype=np.uint8)
+        self._small_gray = np.empty((small_size[1], small_size[0]), dtype=np.uint8)
+        self._reference = np.empty_like(self._small_gray)
+        self._diff = np.empty_like(self._small_gray)
+        self._mask = np.empty_like(self._small_gray)
+        self._image_shape = image.shape
+
+    def _downsample(self, image):
+        """Sottocampiona il frame (BGR o in scala di grigi) nel buffer `_small_gray`."""
+        size = (self._small_gray.shape[1], self._small_gray.shape[0])
+        if image.ndim == 3:
+            # Il frame a colori viene prima ridotto e poi convertito: la conversione costa 1/64
+            cv2.resize(image, size, dst=self._small, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._small_gray)
+        else:
+            cv2.resize(image, size, dst=self._small_gray, interpolation=cv2.INTER_AREA)
+
+    def check(self, image):
+        """
+        Confronta il frame con il riferimento dell'ultimo rilevamento completo.
+
+        Args:
+            image (numpy.ndarray): Frame BGR (H, W, 3) o in scala di grigi (H, W).
+
+        Returns:
+            bool: True se il frame va elaborato completamente (poi chiamare update()),
+                  False se è possibile riutilizzare `cached`.
+        """
+        start = time.perf_counter()
+        if self._small_gray is None or image.shape != self._image_shape:
+            self._allocate(image)
+            self.cached = None
+        self._downsample(image)
+
+        changed = True
+        if self.cached is None or self.clock() - self._last_full >= self.max_interval:
+            self.forced += 1
+        else:
+            cv2.absdiff(self._small_gray, self._reference, dst=self._diff)
+            cv2.threshold(self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self._mask)
+            changed = cv2.countNonZero(self._mask) > self.min_changed_pixels
+            if not changed:
+                for x0, y0, x1, y1 in self._rois:
+                    if cv2.mean(self._diff[y0:y1, x0:x1])[0] > self.roi_threshold:
+                        changed = True
+                        break
+            if changed:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        self._pending = changed
+        self._gate_seconds += time.perf_counter() - start
+        return changed
+
+    def update(self, corners, ids, rvecs, tvecs, timestamp, elapsed=0.0):
+        """
+        Memorizza i risultati di un rilevamento completo e usa il frame
+        dell'ultima check() come nuovo riferimento.
+
+        Args:
+            corners, ids: Risultati di aruco.detectMarkers (ids può essere None).
+            rvecs, tvecs: Pose stimate (N, 1, 3); vengono copiate.
+            timestamp (float): Timestamp del frame da cui derivano i risultati.
+            elapsed (float): Durata (secondi) del rilevamento completo, per le statistiche.
+        """
+        if not self._pending:
+            raise RuntimeError("MotionGate.update() va chiamato solo quando check() restituisce True")
+        self._pending = False
+        np.copyto(self._reference, self._small_gray)
+        self._last_full = self.clock()
+        self._full_seconds += elapsed
+
+        if rvecs is not None:
+            rvecs = np.array(rvecs, copy=True)
+            tvecs = np.array(tvecs, copy=True)
+        self.cached = (corners, ids, rvecs, tvecs, timestamp)
+
+        # ROI dei marker alla risoluzione sottocampionata
+        self._rois = []
+        if ids is not None:
+            height, width = self._small_gray.shape
+            for c in corners:
+                x_min, y_min = (c.reshape(4, 2).min(axis=0) - ROI_MARGIN) * self.scale
+                x_max, y_max = (c.reshape(4, 2).max(axis=0) + ROI_MARGIN) * self.scale
+                x0, y0 = max(0, int(x_min)), max(0, int(y_min))
+                x1, y1 = min(width, int(np.ceil(x_max))), min(height, int(np.ceil(y_max)))
+                if x1 > x0 and y1 > y0:
+                    self._rois.append((x0, y0, x1, y1))
+
+    def stats(self):
+        """
+        Restituisce le statistiche del gate.
+
+        Returns:
+            dict: 'hits', 'misses', 'forced', 'hit_rate' (frazione di frame serviti
+                  dalla cache), 'gate_ms' (costo medio del gate per frame) e
+                  'saved_s' (CPU risparmiata stimata: costo medio di un rilevamento
+                  completo per i frame serviti dalla cache, meno il costo del gate).
+        """
+        frames = self.hits + self.misses + self.forced
+        full_frames = self.misses + self.forced
+        average_full = self._full_seconds / full_frames if full_frames else 0.0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'forced': self.forced,
+            'hit_rate': self.hits / frames if frames else 0.0,
+            'gate_ms': self._gate_seconds / frames * 1000.0 if frames else 0.0,
+            'saved_s': self.hits * average_full - self._gate_seconds,
+        }